@@ -1,13 +1,25 @@
 # orchestrator/run_benchmark.py
 #!/usr/bin/env python3
+import array
+import functools
+import hashlib
 import subprocess
 import time
-import json
 import os
 import threading
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from collections import defaultdict
 
+import docker
+import orjson
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 LIBRARIES = [
     "requests",
     "httpx",
@@ -21,28 +33,88 @@ LIBRARIES = [
 
 CONCURRENCY_LEVELS = [8, 32, 128, 512]
 
-def start_server_with_retry(max_retries=3):
+SCRIPT_DIR = Path(__file__).resolve().parent
+REPO_DIR = SCRIPT_DIR.parent
+RESULTS_DIR = REPO_DIR / "results"
+SUMMARY_STREAM_PATH = RESULTS_DIR / "summary.ndjson"
+
+# Cada projeto Compose isolado (servidor + cliente) ocupa 4 CPUs
+CPUS_PER_PROJECT = 4
+SERVER_BASE_PORT = 8080
+# Cobre o start_period (30s) do healthcheck e a primeira sonda de 30s em engines sem start_interval
+SERVER_START_TIMEOUT_S = 45
+
+# Um serviço representativo por imagem: os demais compartilham a mesma tag
+BUILD_SERVICES = {
+    "server": ("server", "benchmark_server"),
+    "client_requests_8": ("clients/python", "benchmark_client_python"),
+    "client_undici_8": ("clients/javascript", "benchmark_client_javascript"),
+    "client_nethttp_8": ("clients/go", "benchmark_client_go"),
+    "client_httpoison_8": ("clients/elixir", "benchmark_client_elixir"),
+}
+
+# Amostras ficam num array('d') plano, uma linha (timestamp, *SAMPLE_FIELDS) por coleta
+SAMPLE_FIELDS = ('cpu_percent', 'memory_used_mb', 'memory_total_mb', 'memory_percent')
+SAMPLE_WIDTH = 1 + len(SAMPLE_FIELDS)
+# Piso evita intervalo zero/negativo (loop sem pausa e divisão por zero no limite de falhas)
+SAMPLE_INTERVAL_S = max(float(os.environ.get("SAMPLE_INTERVAL_S", "1.0")), 0.1)
+WARMUP_DURATION_S = 120  # Igual ao WARMUP_DURATION dos clientes no docker-compose.yml
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+HOST_MEMORY_BYTES = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") if hasattr(os, "sysconf") else 0
+
+def get_docker_client():
+    """Cliente da API do Docker, criado uma vez por processo (conexão persistente com o daemon)"""
+    # Chaveado pelo PID: workers criados por fork não reaproveitam o socket do processo pai
+    return _docker_client_for_pid(os.getpid())
+
+@functools.lru_cache(maxsize=None)
+def _docker_client_for_pid(pid):
+    return docker.from_env()
+
+def compose_command(project_name, *args):
+    """Monta um comando docker-compose para o projeto informado"""
+    return ["docker-compose", "-p", project_name, *args]
+
+def get_server_container_name(project_name):
+    """Nome do container do servidor de um projeto"""
+    return f"{project_name}_server"
+
+def get_result_file(project_name, library, concurrency):
+    """Arquivo de resultado gravado pelo cliente de um teste"""
+    return RESULTS_DIR / project_name / f"{library}_c{concurrency}.json"
+
+def get_client_container_name(project_name, service_name):
+    """Nome fixo (container_name no compose) do container de um cliente"""
+    return f"{project_name}_{service_name}"
+
+def start_server_with_retry(project_name, max_retries=3):
     """Inicia o servidor com retry em caso de falha"""
+    server_container_name = get_server_container_name(project_name)
     for i in range(max_retries):
         try:
-            result = subprocess.run(
-                ["docker-compose", "up", "-d", "server"],
+            # Só o stderr é capturado, para o log em caso de falha
+            subprocess.run(
+                compose_command(project_name, "up", "-d", "server"),
                 check=True,
                 timeout=30,
-                capture_output=True,
-                text=True
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
             )
-            # Aguarda um pouco e verifica se está rodando
-            time.sleep(3)
-            if wait_for_server(max_wait=10):
+            # Aguarda o healthcheck do servidor
+            if wait_for_server(server_container_name, max_wait=SERVER_START_TIMEOUT_S):
                 return True
         except subprocess.CalledProcessError as e:
             if i < max_retries - 1:
                 print(f"Warning: Failed to start server (attempt {i+1}/{max_retries}): {e}")
+                if e.stderr:
+                    print(f"  stderr: {e.stderr.decode(errors='replace')[:500]}")
                 print(f"Retrying in 5 seconds...")
                 time.sleep(5)
             else:
                 print(f"Error: Failed to start server after {max_retries} attempts: {e}")
+                if e.stderr:
+                    print(f"  stderr: {e.stderr.decode(errors='replace')[:500]}")
                 return False
         except subprocess.TimeoutExpired:
             if i < max_retries - 1:
@@ -54,247 +126,380 @@ def start_server_with_retry(max_retries=3):
                 return False
     return False
 
-def wait_for_server(max_wait=30):
-    """Verifica se o servidor está rodando"""
-    for i in range(max_wait):
-        try:
-            result = subprocess.run(
-                ["docker", "ps", "--filter", "name=benchmark_server", "--format", "{{.Status}}"],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if result.returncode == 0 and "Up" in result.stdout:
-                return True
-        except Exception:
-            pass
-        time.sleep(1)
-    return False
+def reset_server_metrics():
+    """Zera as métricas acumuladas do servidor entre testes"""
+    port = os.environ.get("SERVER_HOST_PORT", str(SERVER_BASE_PORT))
+    try:
+        request = urllib.request.Request(f"http://localhost:{port}/control/reset", method="POST")
+        with urllib.request.urlopen(request, timeout=5):
+            return True
+    except OSError as e:
+        print(f"Warning: Failed to reset server metrics: {e}")
+        return False
 
-def get_container_name_by_service(service_name):
-    """Obtém o nome real do container pelo nome do serviço"""
+def get_server_health(server_container_name):
+    """Obtém o estado do healthcheck do servidor ("running" se não houver healthcheck)"""
     try:
-        # Primeiro tenta usar docker-compose ps para obter o nome exato
-        result = subprocess.run(
-            ["docker-compose", "ps", "-q", service_name],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode == 0 and result.stdout.strip():
-            container_id = result.stdout.strip().split('\n')[0]
-            # Obtém o nome do container pelo ID
-            name_result = subprocess.run(
-                ["docker", "inspect", "--format", "{{.Name}}", container_id],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            if name_result.returncode == 0 and name_result.stdout.strip():
-                container_name = name_result.stdout.strip().lstrip('/')
-                return container_name
-        
-        # Fallback: Lista todos os containers rodando e procura
-        result = subprocess.run(
-            ["docker", "ps", "--format", "{{.Names}}"],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
-        
-        if result.returncode == 0 and result.stdout.strip():
-            containers = result.stdout.strip().split('\n')
-            
-            # Procura por diferentes padrões de nome
-            patterns = [
-                service_name,  # Nome direto
-                f"tcc2-rps-benchmark-{service_name}",  # Com prefixo do projeto
-                f"{service_name}-1",  # Com sufixo -1
-                f"tcc2-rps-benchmark-{service_name}-1",  # Com prefixo e sufixo
-            ]
-            
-            for container in containers:
-                container = container.strip()
-                for pattern in patterns:
-                    if pattern in container:
-                        return container
-            
-            # Se não encontrou por padrão, procura por substring
-            for container in containers:
-                container = container.strip()
-                # Remove prefixos comuns e compara
-                clean_name = container.replace('tcc2-rps-benchmark-', '').replace('-1', '')
-                if clean_name == service_name or service_name in container:
-                    return container
-        
-        return None
-    except Exception as e:
+        state = get_docker_client().containers.get(server_container_name).attrs['State']
+        return state['Health']['Status'] if state.get('Health') else state['Status']
+    except Exception:
         return None
 
-def get_container_stats(container_name_or_service):
-    """Obtém estatísticas de CPU e memória de um container"""
+def wait_for_server(server_container_name, max_wait=30):
+    """Aguarda o servidor ficar saudável via eventos de healthcheck do Docker"""
+    events = None
     try:
-        # Se não encontrar pelo nome direto, tenta buscar pelo serviço
-        container_name = container_name_or_service
-        if not container_name.startswith('tcc2-rps-benchmark-') and not container_name == 'benchmark_server':
-            found_name = get_container_name_by_service(container_name_or_service)
-            if found_name:
-                container_name = found_name
-        
-        # Obtém stats do container específico
-        stats_result = subprocess.run(
-            ["docker", "stats", "--no-stream", "--format", 
-             "{{.CPUPerc}}\t{{.MemUsage}}\t{{.MemPerc}}", container_name],
-            capture_output=True,
-            text=True,
-            timeout=5
+        # O daemon encerra o stream de eventos sozinho ao atingir o until
+        events = get_docker_client().events(
+            until=int(time.time() + max_wait),
+            filters={'container': server_container_name, 'event': 'health_status'},
+            decode=True
         )
         
-        if stats_result.returncode != 0 or not stats_result.stdout.strip():
-            return None
+        # Confere o estado atual depois de assinar os eventos para não perder a transição
+        if get_server_health(server_container_name) in ("healthy", "running"):
+            return True
         
-        parts = stats_result.stdout.strip().split('\t')
-        if len(parts) < 3:
-            return None
+        for event in events:
+            if event.get('Action', event.get('status')) == "health_status: healthy":
+                return True
+        return False
+    except Exception:
+        return False
+    finally:
+        if events is not None:
+            events.close()
+
+def wait_for_client_exit(container_name, timeout=30):
+    """Bloqueia até o container do cliente terminar"""
+    try:
+        get_docker_client().containers.get(container_name).wait(timeout=timeout)
+        return True
+    except docker.errors.NotFound:
+        return True
+    except Exception:
+        print(f"Warning: Client container {container_name} still running after {timeout}s")
+        return False
+
+def start_api_stats_stream(container_name, latest_stats, stop_event):
+    """Lê em background o stream de stats da API do Docker de um container"""
+    reader = threading.Thread(
+        target=_read_api_stats_stream,
+        args=(container_name, latest_stats, stop_event),
+        daemon=True
+    )
+    reader.start()
+    return reader
+
+def _read_api_stats_stream(container_name, latest_stats, stop_event):
+    while not stop_event.is_set():
+        try:
+            stream = get_docker_client().api.stats(container_name, stream=True, decode=True)
+            # O Docker emite ~1 quadro/s, então o stop_event é checado com essa frequência
+            for frame in stream:
+                if stop_event.is_set():
+                    return
+                stat = parse_api_stats(frame)
+                if stat:
+                    latest_stats[container_name] = stat
+        except Exception:
+            pass
+        # Container ainda não iniciado ou já encerrado: tenta de novo
+        stop_event.wait(1)
+
+def get_container_id(container_name):
+    """Obtém o ID completo de um container"""
+    try:
+        return get_docker_client().containers.get(container_name).id
+    except Exception:
+        return None
+
+def open_cgroup_stats(container_id):
+    """Abre os arquivos de cgroup v2 do container para leitura direta de CPU e memória"""
+    # systemd cgroup driver (padrão) e cgroupfs driver
+    candidates = [
+        CGROUP_ROOT / "system.slice" / f"docker-{container_id}.scope",
+        CGROUP_ROOT / "docker" / container_id,
+    ]
+    
+    for cgroup_dir in candidates:
+        fds = {}
+        try:
+            for key, filename in (("cpu", "cpu.stat"), ("memory", "memory.current"),
+                                  ("memory_stat", "memory.stat"), ("memory_max", "memory.max")):
+                fds[key] = os.open(cgroup_dir / filename, os.O_RDONLY)
+            handle = {'fds': fds, 'usage_usec': None, 'wall_ns': None}
+            # Primeira leitura só estabelece a base para o delta de CPU
+            _read_cpu_usage_usec(handle)
+            return handle
+        except OSError:
+            for fd in fds.values():
+                os.close(fd)
+    return None
+
+def close_cgroup_stats(handle):
+    """Fecha os descritores abertos por open_cgroup_stats"""
+    for fd in handle['fds'].values():
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+def _pread_text(fd):
+    return os.pread(fd, 8192, 0).decode()
+
+def _read_cpu_usage_usec(handle):
+    wall_ns = time.monotonic_ns()
+    for line in _pread_text(handle['fds']['cpu']).splitlines():
+        if line.startswith("usage_usec "):
+            usage_usec = int(line.split()[1])
+            break
+    else:
+        raise OSError("usage_usec not found in cpu.stat")
+    
+    previous = (handle['usage_usec'], handle['wall_ns'])
+    handle['usage_usec'] = usage_usec
+    handle['wall_ns'] = wall_ns
+    return usage_usec, wall_ns, previous
+
+def read_cgroup_stats(handle):
+    """Lê CPU e memória dos arquivos de cgroup já abertos"""
+    try:
+        usage_usec, wall_ns, (prev_usage_usec, prev_wall_ns) = _read_cpu_usage_usec(handle)
+        delta_wall_usec = (wall_ns - prev_wall_ns) / 1000
+        # Mesma escala do docker stats: 100% = um core inteiro
+        cpu_percent = (usage_usec - prev_usage_usec) / delta_wall_usec * 100 if delta_wall_usec > 0 else 0.0
         
-        cpu_perc = parts[0].rstrip('%')
-        mem_usage = parts[1]  # e.g., "123.45MiB / 2GiB"
-        mem_perc = parts[2].rstrip('%')
+        mem_used = int(_pread_text(handle['fds']['memory']))
+        # docker stats desconta o page cache inativo do uso de memória
+        for line in _pread_text(handle['fds']['memory_stat']).splitlines():
+            if line.startswith("inactive_file "):
+                mem_used -= min(int(line.split()[1]), mem_used)
+                break
         
-        # Parse memory usage
-        mem_parts = mem_usage.split(' / ')
-        if len(mem_parts) == 2:
-            mem_used_str = mem_parts[0]
-            mem_total_str = mem_parts[1]
-            
-            # Convert to MB
-            def parse_memory(mem_str):
-                mem_str = mem_str.strip()
-                if 'GiB' in mem_str:
-                    return float(mem_str.replace('GiB', '').strip()) * 1024
-                elif 'MiB' in mem_str:
-                    return float(mem_str.replace('MiB', '').strip())
-                elif 'KiB' in mem_str:
-                    return float(mem_str.replace('KiB', '').strip()) / 1024
-                elif 'B' in mem_str:
-                    return float(mem_str.replace('B', '').strip()) / (1024 * 1024)
-                return 0.0
-            
-            mem_used_mb = parse_memory(mem_used_str)
-            mem_total_mb = parse_memory(mem_total_str)
-        else:
-            mem_used_mb = 0.0
-            mem_total_mb = 0.0
+        mem_max = _pread_text(handle['fds']['memory_max']).strip()
+        mem_total = HOST_MEMORY_BYTES if mem_max == "max" else int(mem_max)
         
         return {
-            'cpu_percent': float(cpu_perc) if cpu_perc else 0.0,
-            'memory_used_mb': mem_used_mb,
-            'memory_total_mb': mem_total_mb,
-            'memory_percent': float(mem_perc) if mem_perc else 0.0
+            'cpu_percent': cpu_percent,
+            'memory_used_mb': mem_used / (1024 * 1024),
+            'memory_total_mb': mem_total / (1024 * 1024),
+            'memory_percent': mem_used / mem_total * 100 if mem_total else 0.0
         }
-    except Exception as e:
+    except (OSError, ValueError):
         return None
 
-def monitor_containers(client_service_name, server_container_name, duration, stats_data, stop_event):
-    """Monitora containers durante a execução do teste"""
-    start_time = time.time()
-    end_time = start_time + duration + 120  # Monitora por duration + buffer maior
+def append_sample(samples, stat):
+    """Acrescenta uma amostra com timestamp ao buffer de estatísticas"""
+    samples.append(time.monotonic())
+    samples.extend(stat[field] for field in SAMPLE_FIELDS)
+
+def count_samples(samples):
+    """Número de amostras em um buffer de estatísticas"""
+    return len(samples) // SAMPLE_WIDTH
+
+def _percentile(sorted_values, q):
+    # Interpolação linear, igual ao padrão do numpy.percentile
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def _column_means(rows):
+    if not rows:
+        return [0.0] * len(SAMPLE_FIELDS)
+    return [sum(column) / len(rows) for column in zip(*rows)]
+
+def first_sample_time(samples):
+    """Timestamp da primeira amostra de um buffer (None se vazio)"""
+    return samples[0] if samples else None
+
+def calculate_averages(samples, client_start):
+    """Calcula médias, percentis de CPU e médias de warmup/regime de um buffer de amostras"""
+    n = count_samples(samples)
+    if not n:
+        means = warmup_means = steady_means = [0.0] * len(SAMPLE_FIELDS)
+        cpu_percentiles = [0.0, 0.0, 0.0]
+    elif np is not None:
+        rows = np.frombuffer(samples, dtype=np.float64).reshape(n, SAMPLE_WIDTH)
+        values = rows[:, 1:]
+        elapsed = rows[:, 0] - client_start
+        # Amostras anteriores ao início do cliente não pertencem a nenhuma das fases
+        warmup = (elapsed >= 0) & (elapsed < WARMUP_DURATION_S)
+        steady = elapsed >= WARMUP_DURATION_S
+        means = values.mean(axis=0)
+        cpu_percentiles = np.percentile(values[:, 0], [50, 95, 99])
+        warmup_means = values[warmup].mean(axis=0) if warmup.any() else [0.0] * len(SAMPLE_FIELDS)
+        steady_means = values[steady].mean(axis=0) if steady.any() else [0.0] * len(SAMPLE_FIELDS)
+    else:
+        rows = [samples[i * SAMPLE_WIDTH:(i + 1) * SAMPLE_WIDTH] for i in range(n)]
+        means = _column_means([row[1:] for row in rows])
+        cpu_values = sorted(row[1] for row in rows)
+        cpu_percentiles = [_percentile(cpu_values, q) for q in (50, 95, 99)]
+        warmup_means = _column_means([row[1:] for row in rows if 0 <= row[0] - client_start < WARMUP_DURATION_S])
+        steady_means = _column_means([row[1:] for row in rows if row[0] - client_start >= WARMUP_DURATION_S])
     
-    client_stats = []
-    server_stats = []
+    result = {f"{field}_avg": float(mean) for field, mean in zip(SAMPLE_FIELDS, means)}
+    for q, value in zip((50, 95, 99), cpu_percentiles):
+        result[f"cpu_percent_p{q}"] = float(value)
+    # Separa o warmup do regime estável para não misturar as duas fases na média
+    for index, field in enumerate(SAMPLE_FIELDS[:2]):
+        result[f"{field}_warmup_avg"] = float(warmup_means[index])
+        result[f"{field}_steady_avg"] = float(steady_means[index])
+    return result
+
+def poll_container_stats(client_container_name, server_container_name, end_time, stop_event):
+    """Coleta stats periodicamente via cgroup v2 ou API de stats do Docker"""
+    client_stats = array.array('d')
+    server_stats = array.array('d')
     consecutive_failures = 0
-    max_consecutive_failures = 30  # Aguarda mais tempo para container aparecer
-    
-    # Aguarda container do cliente aparecer
-    client_container_name = None
-    wait_start = time.time()
-    while time.time() - wait_start < 30:  # Aguarda até 30 segundos
-        found_name = get_container_name_by_service(client_service_name)
-        if found_name:
-            client_container_name = found_name
-            print(f"Found client container: {client_container_name}")
-            break
-        time.sleep(1)
+    max_consecutive_failures = int(60 / SAMPLE_INTERVAL_S)  # Aguarda até 60s para container aparecer
+    
+    # Lê direto do cgroup v2; a API de stats do Docker fica apenas como fallback
+    cgroups = {}
+    fallback_containers = []
+    latest_api_stats = {}
+    streams_stop = threading.Event()
     
-    if not client_container_name:
-        print(f"Warning: Could not find client container for {client_service_name}")
+    server_id = get_container_id(server_container_name)
+    server_cgroup = open_cgroup_stats(server_id) if server_id else None
+    # Se o cgroup do servidor é legível, o do cliente também será assim que ele iniciar
+    cgroups_available = server_cgroup is not None
+    if server_cgroup:
+        cgroups[server_container_name] = server_cgroup
+    else:
+        print("Warning: cgroup files unavailable, falling back to the Docker stats API")
+        fallback_containers.append(server_container_name)
+    if not cgroups_available:
+        fallback_containers.append(client_container_name)
+    for container_name in fallback_containers:
+        start_api_stats_stream(container_name, latest_api_stats, streams_stop)
+    client_id = None
+    
+    def sample(container_name):
+        cgroup = cgroups.get(container_name)
+        if cgroup:
+            return read_cgroup_stats(cgroup)
+        return latest_api_stats.pop(container_name, None)
     
     # Monitora enquanto o teste está rodando
-    while not stop_event.is_set() and time.time() < end_time:
-        # Stats do cliente
-        if client_container_name:
-            client_stat = get_container_stats(client_container_name)
+    try:
+        while not stop_event.is_set() and time.time() < end_time:
+            # O cgroup do cliente só existe depois que o container inicia
+            if cgroups_available and client_container_name not in cgroups:
+                client_id = client_id or get_container_id(client_container_name)
+                client_cgroup = open_cgroup_stats(client_id) if client_id else None
+                if client_cgroup:
+                    cgroups[client_container_name] = client_cgroup
+            
+            # Stats do cliente
+            client_stat = sample(client_container_name)
             if client_stat:
-                client_stats.append(client_stat)
+                append_sample(client_stats, client_stat)
                 consecutive_failures = 0
             else:
                 consecutive_failures += 1
-        else:
-            # Tenta encontrar novamente
-            found_name = get_container_name_by_service(client_service_name)
-            if found_name:
-                client_container_name = found_name
-                print(f"Found client container (retry): {client_container_name}")
-        
-        # Stats do servidor
-        server_stat = get_container_stats(server_container_name)
-        if server_stat:
-            server_stats.append(server_stat)
-        
-        # Se não conseguir obter stats do cliente por muito tempo e já coletou dados, pode ter terminado
-        if consecutive_failures >= max_consecutive_failures and len(client_stats) > 10:
-            break
-        
-        time.sleep(2)  # Coleta stats a cada 2 segundos
+            
+            # Stats do servidor
+            server_stat = sample(server_container_name)
+            if server_stat:
+                append_sample(server_stats, server_stat)
+            
+            # Se não conseguir obter stats do cliente por muito tempo e já coletou dados, pode ter terminado
+            if consecutive_failures >= max_consecutive_failures and count_samples(client_stats) > 10:
+                break
+            
+            time.sleep(SAMPLE_INTERVAL_S)
+    finally:
+        for cgroup in cgroups.values():
+            close_cgroup_stats(cgroup)
+        streams_stop.set()
     
-    # Calcula médias
-    def calculate_averages(stats_list):
-        if not stats_list:
-            return {
-                'cpu_percent_avg': 0.0,
-                'memory_used_mb_avg': 0.0,
-                'memory_total_mb_avg': 0.0,
-                'memory_percent_avg': 0.0
-            }
-        
-        return {
-            'cpu_percent_avg': sum(s['cpu_percent'] for s in stats_list) / len(stats_list),
-            'memory_used_mb_avg': sum(s['memory_used_mb'] for s in stats_list) / len(stats_list),
-            'memory_total_mb_avg': sum(s['memory_total_mb'] for s in stats_list) / len(stats_list) if stats_list else 0.0,
-            'memory_percent_avg': sum(s['memory_percent'] for s in stats_list) / len(stats_list)
-        }
+    return client_stats, server_stats
+
+def parse_api_stats(frame):
+    """Converte um quadro da API de stats do Docker em amostra de CPU e memória"""
+    cpu_stats = frame.get('cpu_stats') or {}
+    precpu_stats = frame.get('precpu_stats') or {}
+    memory_stats = frame.get('memory_stats') or {}
+    
+    system_delta = cpu_stats.get('system_cpu_usage', 0) - precpu_stats.get('system_cpu_usage', 0)
+    mem_total = memory_stats.get('limit', 0)
+    # Containers parados (ou o primeiro quadro) vêm sem base para o delta
+    if system_delta <= 0 or not mem_total:
+        return None
     
-    stats_data['client'] = calculate_averages(client_stats)
-    stats_data['server'] = calculate_averages(server_stats)
+    cpu_delta = (cpu_stats.get('cpu_usage', {}).get('total_usage', 0)
+                 - precpu_stats.get('cpu_usage', {}).get('total_usage', 0))
+    online_cpus = cpu_stats.get('online_cpus') or len(cpu_stats.get('cpu_usage', {}).get('percpu_usage') or []) or 1
+    
+    # Mesmo cálculo do docker stats: desconta o page cache inativo (cgroup v2 / v1)
+    mem_stat = memory_stats.get('stats', {})
+    mem_cache = mem_stat.get('inactive_file', mem_stat.get('total_inactive_file', 0))
+    mem_used = max(memory_stats.get('usage', 0) - mem_cache, 0)
+    
+    return {
+        'cpu_percent': cpu_delta / system_delta * online_cpus * 100,
+        'memory_used_mb': mem_used / (1024 * 1024),
+        'memory_total_mb': mem_total / (1024 * 1024),
+        'memory_percent': mem_used / mem_total * 100
+    }
+
+def monitor_containers(client_container_name, server_container_name, duration, stats_data, stop_event):
+    """Monitora containers durante a execução do teste"""
+    start_time = time.time()
+    end_time = start_time + duration + 120  # Monitora por duration + buffer maior
+    
+    # cgroup v2 primeiro; o stream de stats da API do Docker só entra como fallback
+    client_stats, server_stats = poll_container_stats(
+        client_container_name, server_container_name, end_time, stop_event)
+    
+    # O warmup conta a partir da primeira amostra do cliente, não do início do monitoramento
+    client_start = first_sample_time(client_stats)
+    if client_start is None:
+        client_start = time.monotonic()
+    
+    # Calcula médias
+    stats_data['client'] = calculate_averages(client_stats, client_start)
+    stats_data['server'] = calculate_averages(server_stats, client_start)
     
     # Log para debug
-    print(f"Monitoring completed: Client samples={len(client_stats)}, Server samples={len(server_stats)}")
-    if len(client_stats) == 0:
-        print(f"Warning: No client stats collected for {client_service_name}")
-    if len(server_stats) == 0:
+    print(f"Monitoring completed: Client samples={count_samples(client_stats)}, "
+          f"Server samples={count_samples(server_stats)}")
+    if not client_stats:
+        print(f"Warning: No client stats collected for {client_container_name}")
+    if not server_stats:
         print(f"Warning: No server stats collected")
 
-def run_single_test(library, concurrency):
+def run_single_test(library, concurrency, project_name):
     """Executa um teste individual"""
     print(f"\n{'='*80}")
-    print(f"Testing: {library} with concurrency {concurrency}")
+    print(f"Testing: {library} with concurrency {concurrency} [{project_name}]")
     print(f"{'='*80}\n")
     
     service_name = f"client_{library}_{concurrency}"
-    client_container_name = service_name  # Será resolvido dinamicamente
-    server_container_name = "benchmark_server"
+    server_container_name = get_server_container_name(project_name)
+    # container_name fixo no compose: não há nome a descobrir em tempo de execução
+    client_container_name = get_client_container_name(project_name, service_name)
     
-    # Inicia o servidor se não estiver rodando (com retry)
-    if not start_server_with_retry():
-        print(f"Error: Could not start server for {library}_c{concurrency}")
-        return False, {}
-    
-    # Aguarda servidor estar completamente pronto
-    if not wait_for_server(max_wait=15):
+    # O servidor é compartilhado pelos testes do projeto; só confere se está vivo
+    if not wait_for_server(server_container_name, max_wait=15):
         print(f"Warning: Server may not be ready for {library}_c{concurrency}")
     
-    time.sleep(2)  # Buffer adicional
+    # O servidor não é recriado entre testes: descarta latências do teste anterior
+    reset_server_metrics()
+    
+    # Cria o container do cliente antes do monitoramento para que a API de stats já o encontre
+    try:
+        subprocess.run(
+            compose_command(project_name, "up", "--no-start", "--no-deps", service_name),
+            check=False,
+            timeout=60,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+    except subprocess.TimeoutExpired:
+        print(f"Warning: Timed out creating container for {service_name}")
     
     # Dados para coletar stats
     stats_data = {}
@@ -305,7 +510,7 @@ def run_single_test(library, concurrency):
     test_duration = 120 + 180 + 120  # ~7 minutos
     monitor_thread = threading.Thread(
         target=monitor_containers,
-        args=(service_name, server_container_name, test_duration, stats_data, stop_event),
+        args=(client_container_name, server_container_name, test_duration, stats_data, stop_event),
         daemon=False  # Não é daemon para garantir que termina corretamente
     )
     
@@ -320,7 +525,7 @@ def run_single_test(library, concurrency):
         time.sleep(1)  # Pequeno delay para garantir que monitoramento está rodando
         
         subprocess.run(
-            ["docker-compose", "up", "--abort-on-container-exit", service_name],
+            compose_command(project_name, "up", "--no-deps", "--abort-on-container-exit", service_name),
             check=True,
             timeout=timeout_seconds
         )
@@ -341,113 +546,244 @@ def run_single_test(library, concurrency):
         monitor_thread.join(timeout=30)  # Aguarda até 30 segundos para thread terminar
     
     # Atualiza arquivo JSON de resultados com stats (mesmo se teste falhou)
-    script_dir = Path(__file__).parent
-    results_dir = script_dir.parent / "results"
-    result_file = results_dir / f"{library}_c{concurrency}.json"
+    result_file = get_result_file(project_name, library, concurrency)
     
     if result_file.exists():
-        try:
-            with open(result_file, 'r') as f:
-                result_data = json.load(f)
-            
+        result_data = _load_result_file(result_file)
+        if result_data is not None:
             # Adiciona métricas de recursos (garante estrutura mesmo se vazia)
             if not stats_data:
+                empty_stats = calculate_averages(array.array('d'), time.monotonic())
                 stats_data = {
-                    'client': {
-                        'cpu_percent_avg': 0.0,
-                        'memory_used_mb_avg': 0.0,
-                        'memory_total_mb_avg': 0.0,
-                        'memory_percent_avg': 0.0
-                    },
-                    'server': {
-                        'cpu_percent_avg': 0.0,
-                        'memory_used_mb_avg': 0.0,
-                        'memory_total_mb_avg': 0.0,
-                        'memory_percent_avg': 0.0
-                    }
+                    'client': dict(empty_stats),
+                    'server': dict(empty_stats)
                 }
             
             result_data['resource_usage'] = stats_data
             
-            with open(result_file, 'w') as f:
-                json.dump(result_data, f, indent=2)
+            try:
+                with open(result_file, 'wb') as f:
+                    f.write(orjson.dumps(result_data, option=orjson.OPT_INDENT_2))
+                print(f"Added resource metrics to {result_file.name}")
+            except OSError as e:
+                print(f"Warning: Failed to update result file with resource metrics: {e}")
+            
+            # Vai para o stream mesmo se a regravação falhou: o summary não perde o teste
+            append_summary_stream(result_data)
             
-            print(f"Added resource metrics to {result_file.name}")
             if stats_data.get('client', {}).get('cpu_percent_avg', 0) == 0:
                 print(f"  Warning: Resource metrics appear to be empty or zero")
-        except Exception as e:
-            print(f"Warning: Failed to update result file with resource metrics: {e}")
     
-    # Limpa containers
-    subprocess.run(["docker-compose", "down"], check=False)
+    # Garante que o cliente saiu antes de removê-lo
+    wait_for_client_exit(client_container_name)
+    
+    # Remove apenas o container do cliente; o servidor segue para o próximo teste
+    subprocess.run(compose_command(project_name, "rm", "-fsv", service_name), check=False,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
     
     return test_success, stats_data
 
+def _load_result_file(json_file):
+    try:
+        with open(json_file, 'rb') as f:
+            data = orjson.loads(f.read())
+        # Only add valid results (must have library field)
+        if isinstance(data, dict) and "library" in data:
+            return data
+        print(f"Warning: Skipping invalid result file {json_file.name}")
+    except (orjson.JSONDecodeError, IOError) as e:
+        print(f"Warning: Failed to read {json_file.name}: {e}")
+    return None
+
 def collect_results():
     """Coleta todos os arquivos JSON de resultados"""
-    # Get results directory relative to script location
-    script_dir = Path(__file__).parent
-    results_dir = script_dir.parent / "results"
-    all_results = []
-    
-    if not results_dir.exists():
-        print(f"Warning: Results directory {results_dir} does not exist")
-        return all_results
-    
-    # Skip summary.json itself
-    for json_file in sorted(results_dir.glob("*.json")):
-        if json_file.name == "summary.json":
-            continue
-            
-        try:
-            with open(json_file, 'r') as f:
-                data = json.load(f)
-                # Only add valid results (must have library field)
-                if isinstance(data, dict) and "library" in data:
-                    all_results.append(data)
-                else:
-                    print(f"Warning: Skipping invalid result file {json_file.name}")
-        except (json.JSONDecodeError, IOError) as e:
-            print(f"Warning: Failed to read {json_file.name}: {e}")
-    
-    return all_results
-
-def generate_summary_report(results):
-    """Gera relatório consolidado"""
-    script_dir = Path(__file__).parent
-    summary_path = script_dir.parent / "results" / "summary.json"
-    summary_path.parent.mkdir(exist_ok=True)
-    
-    with open(summary_path, 'w') as f:
-        json.dump(results, f, indent=2)
+    if not RESULTS_DIR.exists():
+        print(f"Warning: Results directory {RESULTS_DIR} does not exist")
+        return []
+    
+    # Une os resultados de todos os projetos (results/<projeto>/*.json)
+    json_files = sorted(RESULTS_DIR.glob("*/*.json"))
+    
+    # Leituras independentes: sobrepõe I/O em threads, preservando a ordem
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(_load_result_file, json_files))
+    
+    return [data for data in results if data is not None]
+
+def append_summary_stream(result_data):
+    """Acrescenta um resultado ao summary.ndjson (acompanhe com tail -f)"""
+    # Uma única escrita em modo append: linhas de projetos paralelos não se intercalam
+    with open(SUMMARY_STREAM_PATH, 'ab') as f:
+        f.write(orjson.dumps(result_data) + b"\n")
+
+def load_summary_stream():
+    """Lê os resultados acumulados no summary.ndjson"""
+    results = []
+    with open(SUMMARY_STREAM_PATH, 'rb') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            # Linha truncada (ex.: processo morto no meio da escrita) não derruba o relatório
+            try:
+                data = orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                print(f"Warning: Skipping invalid line {line_number} of {SUMMARY_STREAM_PATH.name}: {e}")
+                continue
+            if isinstance(data, dict) and "library" in data:
+                results.append(data)
+    return results
+
+def generate_summary_report(expected_files=None):
+    """Gera relatório consolidado a partir do summary.ndjson"""
+    summary_path = RESULTS_DIR / "summary.json"
+    RESULTS_DIR.mkdir(exist_ok=True)
+    
+    try:
+        results = load_summary_stream()
+    except FileNotFoundError:
+        print("Warning: summary.ndjson not found")
+        results = []
+    
+    # Completa com resultados que não chegaram ao stream (ex.: escritos após um timeout)
+    streamed = {(data.get('library'), data.get('concurrency')) for data in results}
+    if expected_files is None:
+        # Sem a matriz de testes (ex.: resultados de outra execução): varre os arquivos individuais
+        missing = [data for data in collect_results()
+                   if (data.get('library'), data.get('concurrency')) not in streamed]
+    else:
+        # Lê só os arquivos dos testes ausentes do stream; nada faltando, nada a ler
+        missing_files = [path for key, path in expected_files.items() if key not in streamed and path.exists()]
+        missing = [data for data in map(_load_result_file, missing_files) if data is not None]
+    if missing:
+        print(f"Warning: {len(missing)} result file(s) missing from summary.ndjson, adding them")
+    results.extend(missing)
+    
+    # Ordem estável independente da ordem em que os projetos terminaram
+    results.sort(key=lambda data: (data.get('library', ''), data.get('concurrency', 0)))
+    
+    with open(summary_path, 'wb') as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2))
     
     print(f"\nSummary saved to {summary_path}")
     print(f"Total results collected: {len(results)}")
 
-def main():
-    # Limpa resultados anteriores
-    script_dir = Path(__file__).parent
-    results_dir = script_dir.parent / "results"
-    results_dir.mkdir(exist_ok=True)
+def hash_directory(directory):
+    """Calcula o sha256 do conteúdo de um diretório de build"""
+    digest = hashlib.sha256()
+    for path in sorted(directory.rglob("*")):
+        if path.is_file():
+            digest.update(str(path.relative_to(directory)).encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+def hash_build_inputs(repo_dir):
+    """Hash barato (nome, tamanho e mtime) de tudo que entra no build"""
+    digest = hashlib.sha256()
+    compose_file = repo_dir / "docker-compose.yml"
+    paths = [compose_file] if compose_file.exists() else []
+    for top in ("clients", "server"):
+        for root, dirs, files in os.walk(repo_dir / top):
+            dirs.sort()
+            paths.extend(Path(root) / name for name in sorted(files))
+    for path in paths:
+        stat = path.stat()
+        digest.update(f"{path.relative_to(repo_dir)}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+def image_exists(image_name):
+    """Verifica se a tag de imagem existe no daemon local"""
+    try:
+        get_docker_client().images.get(image_name)
+        return True
+    except docker.errors.ImageNotFound:
+        return False
+
+def build_images(repo_dir):
+    """Reconstrói em paralelo só as imagens cujo contexto mudou"""
+    # Um único cache: hash rápido de todas as entradas + sha256 por contexto
+    hash_dir = repo_dir / ".build-cache"
+    inputs_file = hash_dir / "inputs.build-hash"
+    inputs_hash = hash_build_inputs(repo_dir)
+    images_present = all(image_exists(image_name) for _, image_name in BUILD_SERVICES.values())
     
-    for old_file in results_dir.glob("*.json"):
-        if old_file.name != "summary.json":  # Keep summary.json
-            old_file.unlink()
+    # Nada mudou desde o último build e as imagens existem: nem chama o docker-compose
+    if images_present and inputs_file.exists() and inputs_file.read_text() == inputs_hash:
+        print("Build inputs unchanged since last build, skipping docker-compose build")
+        return
     
-    # Build das imagens
-    print("Building Docker images...")
-    subprocess.run(["docker-compose", "build"], check=True)
+    hash_dir.mkdir(exist_ok=True)
     
-    # Executa todos os testes
-    total_tests = len(LIBRARIES) * len(CONCURRENCY_LEVELS)
-    completed = 0
+    pending = {}
+    for service, (context, image_name) in BUILD_SERVICES.items():
+        current_hash = hash_directory(repo_dir / context)
+        hash_file = hash_dir / f"{service}.build-hash"
+        # Hash igual não basta: a imagem pode ter sido removida (docker image prune/rm)
+        if not hash_file.exists() or hash_file.read_text() != current_hash or not image_exists(image_name):
+            pending[service] = (hash_file, current_hash)
+    
+    if pending:
+        print(f"Building Docker images: {', '.join(pending)}")
+        os.environ["DOCKER_BUILDKIT"] = "1"
+        os.environ["COMPOSE_DOCKER_CLI_BUILD"] = "1"
+        subprocess.run(["docker-compose", "build", "--parallel", *pending], check=True)
+        
+        for hash_file, current_hash in pending.values():
+            hash_file.write_text(current_hash)
+    else:
+        print("Docker images are up to date, skipping build")
     
-    for library in LIBRARIES:
-        for concurrency in CONCURRENCY_LEVELS:
-            completed += 1
-            print(f"\n[{completed}/{total_tests}] Running test...")
+    inputs_file.write_text(inputs_hash)
+
+def parse_cpu_list(value):
+    """Converte uma lista de CPUs separada por vírgulas ("0,1") em conjunto"""
+    cpus = {int(cpu) for cpu in value.split(",") if cpu.strip()}
+    if not cpus or min(cpus) < 0:
+        raise ValueError(f"invalid CPU list {value!r}")
+    return cpus
+
+def get_available_cpus():
+    """CPUs que este processo pode usar (respeita taskset e cpusets do cgroup)"""
+    if hasattr(os, "sched_getaffinity"):
+        return set(os.sched_getaffinity(0))
+    return set(range(os.cpu_count() or 1))
+
+def pin_orchestrator(orchestrator_cpus):
+    """Fixa o orquestrador (e os processos filhos) nas CPUs reservadas"""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    try:
+        os.sched_setaffinity(0, orchestrator_cpus)
+        print(f"Orchestrator pinned to CPUs {sorted(orchestrator_cpus)}")
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not pin orchestrator to CPUs {sorted(orchestrator_cpus)}: {e}")
+
+def get_project_cpusets(benchmark_cpus, project_index):
+    """CPUs exclusivas (servidor, cliente) de um projeto, fora das do orquestrador"""
+    project_cpus = benchmark_cpus[project_index * CPUS_PER_PROJECT:(project_index + 1) * CPUS_PER_PROJECT]
+    if len(project_cpus) < CPUS_PER_PROJECT:
+        # Máquina pequena demais para isolar: deixa o Docker escolher
+        return "", ""
+    return ",".join(map(str, project_cpus[:2])), ",".join(map(str, project_cpus[2:]))
+
+def run_project_tests(project_name, project_index, tests, cpusets):
+    """Executa em sequência os testes atribuídos a um projeto Compose"""
+    # Cada projeto tem seu próprio servidor, porta no host e diretório de resultados
+    os.environ["BENCH_PROJECT"] = project_name
+    os.environ["SERVER_HOST_PORT"] = str(SERVER_BASE_PORT + project_index)
+    os.environ["RESULTS_DIR"] = f"./results/{project_name}"
+    os.environ["SERVER_CPUSET"], os.environ["CLIENT_CPUSET"] = cpusets
+    
+    outcomes = []
+    try:
+        # Sobe o servidor uma única vez para todos os testes do projeto (com retry)
+        if not start_server_with_retry(project_name):
+            print(f"Error: Could not start server for {project_name}")
+            return [(library, concurrency, False) for library, concurrency in tests]
+        
+        for completed, (library, concurrency) in enumerate(tests, 1):
+            print(f"\n[{project_name}] [{completed}/{len(tests)}] Running test...")
             
-            success, stats = run_single_test(library, concurrency)
+            success, stats = run_single_test(library, concurrency, project_name)
             
             if not success:
                 print(f"Warning: Test {library}_c{concurrency} did not complete successfully")
@@ -456,20 +792,90 @@ def main():
                       f"Memory: {stats.get('client', {}).get('memory_used_mb_avg', 0):.2f}MB | "
                       f"Server CPU: {stats.get('server', {}).get('cpu_percent_avg', 0):.2f}%, "
                       f"Memory: {stats.get('server', {}).get('memory_used_mb_avg', 0):.2f}MB")
-            
-            # Pausa entre testes
-            time.sleep(10)
+            outcomes.append((library, concurrency, success))
+    finally:
+        subprocess.run(compose_command(project_name, "down"), check=False,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    return outcomes
+
+def main():
+    # Lida antes de fixar o orquestrador, que restringe a afinidade deste processo e dos filhos
+    available_cpus = get_available_cpus()
+    
+    # CPUs reservadas ao orquestrador; servidor e clientes rodam nas demais
+    if "ORCHESTRATOR_CPUS" in os.environ:
+        try:
+            orchestrator_cpus = parse_cpu_list(os.environ["ORCHESTRATOR_CPUS"])
+        except ValueError:
+            raise SystemExit(f"Error: ORCHESTRATOR_CPUS must be a comma-separated list of CPU numbers, "
+                             f"got {os.environ['ORCHESTRATOR_CPUS']!r}")
+        if not orchestrator_cpus & available_cpus:
+            raise SystemExit(f"Error: ORCHESTRATOR_CPUS {sorted(orchestrator_cpus)} does not overlap "
+                             f"the CPUs available to this process {sorted(available_cpus)}")
+        # CPUs fora da afinidade herdada (taskset/cpuset) não podem ser usadas
+        orchestrator_cpus &= available_cpus
+    else:
+        # Sob taskset/cpuset a CPU 0 pode não estar disponível: usa a primeira permitida
+        orchestrator_cpus = {min(available_cpus)}
+    
+    benchmark_cpus = sorted(available_cpus - orchestrator_cpus)
+    
+    # Evita que o orquestrador dispute CPU com os containers medidos
+    pin_orchestrator(orchestrator_cpus)
+    
+    # Limpa resultados anteriores
+    RESULTS_DIR.mkdir(exist_ok=True)
+    
+    for old_file in [*RESULTS_DIR.glob("*.json"), *RESULTS_DIR.glob("*/*.json")]:
+        if old_file.name != "summary.json":  # Keep summary.json
+            old_file.unlink()
+    SUMMARY_STREAM_PATH.unlink(missing_ok=True)
+    
+    # Build das imagens
+    build_images(REPO_DIR)
+    
+    # Distribui os testes entre projetos Compose independentes
+    tests = [(library, concurrency) for library in LIBRARIES for concurrency in CONCURRENCY_LEVELS]
+    total_tests = len(tests)
+    workers = min(max(1, len(benchmark_cpus) // CPUS_PER_PROJECT), total_tests)
+    projects = [(f"bench-{i}", i, tests[i::workers], get_project_cpusets(benchmark_cpus, i))
+                for i in range(workers)]
+    
+    for project_name, _, _, _ in projects:
+        (RESULTS_DIR / project_name).mkdir(exist_ok=True)
+    
+    print(f"Running {total_tests} tests across {workers} parallel project(s)")
+    
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(run_project_tests, project_name, project_index, project_tests, cpusets): project_name
+            for project_name, project_index, project_tests, cpusets in projects
+        }
+        for future in as_completed(futures):
+            try:
+                outcomes = future.result()
+            except Exception as e:
+                print(f"Error: Project {futures[future]} aborted: {e}")
+                continue
+            failed.extend(f"{library}_c{concurrency}" for library, concurrency, success in outcomes if not success)
     
-    # Coleta e consolida resultados
-    print("\nCollecting results...")
-    all_results = collect_results()
+    if failed:
+        print(f"\nTests that did not complete successfully: {', '.join(failed)}")
     
-    generate_summary_report(all_results)
+    # Consolida os resultados já transmitidos para o summary.ndjson
+    expected_files = {
+        (library, concurrency): get_result_file(project_name, library, concurrency)
+        for project_name, _, project_tests, _ in projects
+        for library, concurrency in project_tests
+    }
+    generate_summary_report(expected_files)
     
     print("\n" + "="*80)
     print("Benchmark completed!")
     print(f"Total tests: {total_tests}")
-    print(f"Results saved in: {results_dir.absolute()}")
+    print(f"Results saved in: {RESULTS_DIR}")
     print("="*80)
 
 if __name__ == "__main__":